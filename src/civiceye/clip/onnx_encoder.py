@@ -0,0 +1,96 @@
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Any, NamedTuple, Optional
+
+import torch
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None  # type: ignore[assignment]
+
+ONNX_CACHE_DIR = Path.home() / ".cache" / "civiceye"
+ONNX_OPSET = 17
+# Bump whenever the exported module or export arguments change so old graphs are not reused.
+ONNX_EXPORT_VERSION = 2
+
+logger = logging.getLogger(__name__)
+
+
+class _ImageEmbeds(torch.nn.Module):
+    """Return only the projected image embeddings so the export has one output."""
+
+    def __init__(self, model: Any) -> None:
+        super().__init__()
+        self.model = model
+
+    def forward(self, pixel_values: torch.Tensor) -> torch.Tensor:
+        return self.model(pixel_values=pixel_values).image_embeds
+
+
+class EncoderOutput(NamedTuple):
+    """Mirror of the `image_embeds` field of the transformers vision output."""
+
+    image_embeds: torch.Tensor
+
+
+class OnnxImageEncoder:
+    """Stand-in for the CLIP vision model that runs the exported graph in ONNX Runtime."""
+
+    device = torch.device("cpu")
+    dtype = torch.float32
+
+    def __init__(self, session: Any) -> None:
+        self.session = session
+
+    def __call__(self, pixel_values: torch.Tensor) -> EncoderOutput:
+        (embeds,) = self.session.run(None, {"pixel_values": pixel_values.numpy()})
+        return EncoderOutput(image_embeds=torch.from_numpy(embeds))
+
+
+def _onnx_model_path(model: Any, image_size: int) -> Path:
+    """Return a cache path unique to the model checkpoint, input size and export format."""
+    config = model.config
+    name = re.sub(r"[^A-Za-z0-9_.-]+", "_", getattr(config, "_name_or_path", "") or "clip")
+    revision = (getattr(config, "_commit_hash", None) or "local")[:12]
+    return ONNX_CACHE_DIR / (
+        f"clip_vision-{name}-{revision}-{image_size}px-opset{ONNX_OPSET}-v{ONNX_EXPORT_VERSION}.onnx"
+    )
+
+
+def _export(model: Any, image_size: int, path: Path) -> None:
+    """Export the fp32 image tower to ONNX, writing atomically."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # A per-process temp name keeps concurrent exports from clobbering each other.
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    dummy = torch.zeros(1, 3, image_size, image_size)
+    try:
+        torch.onnx.export(
+            _ImageEmbeds(model),
+            (dummy,),
+            str(tmp_path),
+            input_names=["pixel_values"],
+            output_names=["image_embeds"],
+            dynamic_axes={"pixel_values": {0: "batch"}, "image_embeds": {0: "batch"}},
+            opset_version=ONNX_OPSET,
+        )
+        tmp_path.replace(path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+def load_onnx_encoder(model: Any, image_size: int) -> Optional[OnnxImageEncoder]:
+    """Return an ONNX Runtime encoder for the model, exporting it on first use."""
+    if ort is None:
+        return None
+    try:
+        path = _onnx_model_path(model, image_size)
+        if not path.exists():
+            _export(model, image_size, path)
+        session = ort.InferenceSession(str(path), providers=["CPUExecutionProvider"])
+    except Exception as exc:
+        logger.warning("Falling back to PyTorch for CLIP inference: %s", exc)
+        return None
+    return OnnxImageEncoder(session)
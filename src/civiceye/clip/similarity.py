@@ -1,30 +1,132 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
 from io import BytesIO
-from typing import Any, List, Optional
+from typing import Any, Dict, List, Optional
 
+import numpy as np
 import streamlit as st
 import torch
 from PIL import Image
 
 from ..openmaps.models import AddressCandidate
+from .onnx_encoder import load_onnx_encoder
 
 try:
-    from transformers import CLIPModel, CLIPProcessor
+    from transformers import CLIPImageProcessor, CLIPVisionModelWithProjection
 except ImportError:
-    CLIPModel = None  # type: ignore[assignment]
-    CLIPProcessor = None  # type: ignore[assignment]
+    CLIPImageProcessor = None  # type: ignore[assignment]
+    CLIPVisionModelWithProjection = None  # type: ignore[assignment]
+
+EMBEDDING_CACHE_SIZE = 512
+CLIP_INPUT_SIZE = 224
+
+logger = logging.getLogger(__name__)
+
+_EMBEDDING_CACHE_LOCK = threading.Lock()
+# Set once load_clip_model has produced a model, so prefetching never triggers a load.
+_MODEL_READY = threading.Event()
 
 
 @st.cache_resource(show_spinner=False)
 def load_clip_model() -> Optional[tuple[Any, Any]]:
     """Load the CLIP model once per session; returns None if unavailable."""
-    if CLIPModel is None or CLIPProcessor is None:
+    if CLIPVisionModelWithProjection is None or CLIPImageProcessor is None:
         return None
     try:
-        model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32")
-        processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
+        # Only the image tower is ever used, so the text encoder is never loaded.
+        model = CLIPVisionModelWithProjection.from_pretrained("openai/clip-vit-base-patch32")
+        # Only images are encoded, so skip the tokenizer half of CLIPProcessor.
+        processor = CLIPImageProcessor.from_pretrained("openai/clip-vit-base-patch32")
     except Exception:
         return None
-    return model, processor
+    model.eval()
+    model.requires_grad_(False)
+
+    device = _select_device()
+    if device.type == "cpu":
+        # On CPU-only hosts ONNX Runtime's fused kernels beat eager PyTorch dispatch.
+        encoder = load_onnx_encoder(model, CLIP_INPUT_SIZE)
+        if encoder is not None:
+            _MODEL_READY.set()
+            return encoder, processor
+
+    # Half precision halves the weight/activation traffic; cosine ranking is robust to it.
+    # CPUs without native bf16 emulate it, which is slower than staying in fp32.
+    if device.type != "cpu":
+        dtype = torch.float16
+    elif _cpu_supports_bf16():
+        dtype = torch.bfloat16
+    else:
+        dtype = torch.float32
+    model = model.to(device=device, dtype=dtype)
+    compiled = _compile_model(model)
+    _MODEL_READY.set()
+    return compiled, processor
+
+
+def _select_device() -> torch.device:
+    """Pick the fastest available accelerator, falling back to the CPU."""
+    if torch.cuda.is_available():
+        return torch.device("cuda")
+    if torch.backends.mps.is_available():
+        return torch.device("mps")
+    return torch.device("cpu")
+
+
+def _cpu_supports_bf16() -> bool:
+    """Return True when oneDNN can use native bf16 matmuls (AVX-512 BF16 or AMX)."""
+    if not torch.backends.mkldnn.is_available():
+        return False
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as handle:
+            flags = set(handle.read().split())
+    except OSError:
+        return False
+    return bool(flags & {"avx512_bf16", "amx_bf16"})
+
+
+class _CompiledModel:
+    """Run the compiled model, permanently switching to eager mode if it ever fails."""
+
+    def __init__(self, compiled: Any, eager: Any) -> None:
+        self._compiled = compiled
+        self._eager = eager
+
+    @property
+    def device(self) -> torch.device:
+        return self._eager.device
+
+    @property
+    def dtype(self) -> torch.dtype:
+        return self._eager.dtype
+
+    def __call__(self, **inputs: Any) -> Any:
+        if self._compiled is not None:
+            try:
+                return self._compiled(**inputs)
+            except Exception as exc:
+                logger.warning("Compiled CLIP model failed; falling back to eager: %s", exc)
+                self._compiled = None
+        return self._eager(**inputs)
+
+
+def _compile_model(model: Any) -> Any:
+    """Compile the vision model and warm it up; return the eager model on failure."""
+    try:
+        # The batch is however many images missed the cache, so only the batch dimension
+        # varies. No CUDA graphs: they would be re-recorded for every new batch size.
+        compiled = torch.compile(model, dynamic=True, fullgraph=False)
+        with torch.inference_mode():
+            # Two batch sizes make the first real request reuse the dynamic-shape graph.
+            for batch_size in (1, 2):
+                shape = (batch_size, 3, CLIP_INPUT_SIZE, CLIP_INPUT_SIZE)
+                dummy = torch.zeros(shape, dtype=model.dtype, device=model.device)
+                compiled(pixel_values=dummy)
+    except Exception:
+        return model
+    return _CompiledModel(compiled, model)
 
 
 def ensure_rgb(image: Image.Image) -> Image.Image:
@@ -34,43 +136,162 @@ def ensure_rgb(image: Image.Image) -> Image.Image:
     return image
 
 
-def compute_similarity_scores(
-    uploaded_image, candidates: List[AddressCandidate]
-) -> List[AddressCandidate]:
-    """Compute cosine similarity between uploaded image and each map image."""
+def _to_clip_input(data: bytes) -> np.ndarray:
+    """Decode image bytes to an RGB array at roughly CLIP resolution."""
+    image = Image.open(BytesIO(data))
+    # JPEG decoders can downscale while decoding; this is a no-op for other formats.
+    image.draft("RGB", (CLIP_INPUT_SIZE, CLIP_INPUT_SIZE))
+    image = ensure_rgb(image)
+    scale = CLIP_INPUT_SIZE / min(image.size)
+    if scale < 1:
+        size = (round(image.width * scale), round(image.height * scale))
+        image = image.resize(size, Image.Resampling.BILINEAR)
+    # Hand the processor an array so it skips its own PIL-to-numpy copy.
+    return np.asarray(image)
+
+
+@st.cache_resource(show_spinner=False)
+def _embedding_cache() -> "OrderedDict[str, torch.Tensor]":
+    """Process-wide LRU of normalized fp16 map embeddings keyed by image digest."""
+    return OrderedDict()
+
+
+def _image_digest(data: bytes) -> str:
+    """Return a compact content hash for raw image bytes."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _pixel_values(processor: Any, images: List[np.ndarray]) -> torch.Tensor:
+    """Center-crop and normalize pre-scaled arrays in torch; defer to the processor otherwise."""
+    if any(min(image.shape[:2]) != CLIP_INPUT_SIZE for image in images):
+        return processor(images=images, return_tensors="pt")["pixel_values"]
+
+    crops = []
+    for image in images:
+        top = (image.shape[0] - CLIP_INPUT_SIZE) // 2
+        left = (image.shape[1] - CLIP_INPUT_SIZE) // 2
+        crops.append(image[top : top + CLIP_INPUT_SIZE, left : left + CLIP_INPUT_SIZE])
+
+    mean = torch.tensor(processor.image_mean).view(1, 3, 1, 1)
+    std = torch.tensor(processor.image_std).view(1, 3, 1, 1)
+    batch = torch.from_numpy(np.stack(crops)).permute(0, 3, 1, 2).float()
+    return batch.div_(255.0).sub_(mean).div_(std)
+
+
+def _embed_images(model: Any, processor: Any, images: List[np.ndarray]) -> torch.Tensor:
+    """Encode images in a single batch and return L2-normalized float32 embeddings."""
+    with torch.inference_mode():
+        pixel_values = _pixel_values(processor, images)
+        if model.device.type == "cuda":
+            # Page-locked memory lets the whole batch go to the GPU in one async copy.
+            pixel_values = pixel_values.pin_memory()
+        pixel_values = pixel_values.to(model.device, model.dtype, non_blocking=True)
+        feats = model(pixel_values=pixel_values).image_embeds.float()
+        # Embeddings are small; keep them on the CPU for caching and ranking.
+        return (feats / feats.norm(dim=-1, keepdim=True)).cpu()
+
+
+def get_map_embeddings(map_images: List[bytes]) -> Optional[torch.Tensor]:
+    """Return one embedding row per map image, encoding only images not seen before."""
     model_bundle = load_clip_model()
     if not model_bundle:
-        st.warning("Visual similarity requires the `transformers` package with CLIP support.")
-        return candidates
+        return None
 
     model, processor = model_bundle
+    return _cached_embeddings(model, processor, _embedding_cache(), map_images)
 
-    target_bytes = uploaded_image.getvalue()
-    uploaded_image.seek(0)
-    target_img = ensure_rgb(Image.open(BytesIO(target_bytes)))
 
-    with torch.inference_mode():
-        target_emb = model.get_image_features(
-            **processor(images=target_img, return_tensors="pt")
-        )
-        target_emb = target_emb / target_emb.norm(dim=-1, keepdim=True)
+def _cached_embeddings(
+    model: Any, processor: Any, cache: "OrderedDict[str, torch.Tensor]", map_images: List[bytes]
+) -> torch.Tensor:
+    """Look up map embeddings in the LRU and encode the misses in one batch."""
+    digests = [_image_digest(data) for data in map_images]
 
-    for candidate in candidates:
-        if not candidate.map_image:
-            candidate.similarity = None
-            continue
+    found: Dict[str, torch.Tensor] = {}
+    missing: Dict[str, bytes] = {}
+    with _EMBEDDING_CACHE_LOCK:
+        for digest, data in zip(digests, map_images):
+            if digest in cache:
+                cache.move_to_end(digest)
+                found[digest] = cache[digest]
+            else:
+                missing[digest] = data
 
-        map_img = ensure_rgb(Image.open(BytesIO(candidate.map_image)))
+    if missing:
+        images = [_to_clip_input(data) for data in missing.values()]
+        # fp16 halves the cache footprint; cosine ordering is unaffected at this precision.
+        feats = _embed_images(model, processor, images).half()
+        with _EMBEDDING_CACHE_LOCK:
+            for digest, feat in zip(missing, feats):
+                found[digest] = cache[digest] = feat
+            while len(cache) > EMBEDDING_CACHE_SIZE:
+                cache.popitem(last=False)
 
-        with torch.inference_mode():
-            img_emb = model.get_image_features(
-                **processor(images=map_img, return_tensors="pt")
-            )
-            img_emb = img_emb / img_emb.norm(dim=-1, keepdim=True)
-            candidate.similarity = torch.cosine_similarity(target_emb, img_emb).item()
-
-    return sorted(
-        candidates,
-        key=lambda item: item.similarity if item.similarity is not None else -1.0,
-        reverse=True,
-    )
+    return torch.stack([found[digest] for digest in digests]).float()
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _embed_uploaded_bytes(image_bytes: bytes) -> Optional[np.ndarray]:
+    """Embed the reference photo once per distinct upload across reruns."""
+    model_bundle = load_clip_model()
+    if not model_bundle:
+        return None
+    model, processor = model_bundle
+    # Stored as fp16 like the map embeddings; cast back to fp32 only for the matmul.
+    return _embed_images(model, processor, [_to_clip_input(image_bytes)])[0].half().numpy()
+
+
+def prefetch_map_embeddings(map_images: List[bytes]) -> None:
+    """Encode map images in the background, but only if CLIP is already loaded."""
+    if not map_images or not _MODEL_READY.is_set():
+        return
+    # Resolve the cached resources on the script thread; the worker only does tensor work.
+    model_bundle = load_clip_model()
+    if not model_bundle:
+        return
+    model, processor = model_bundle
+    cache = _embedding_cache()
+
+    def _warm() -> None:
+        try:
+            _cached_embeddings(model, processor, cache, map_images)
+        except Exception as exc:
+            logger.warning("Background CLIP embedding failed: %s", exc)
+
+    threading.Thread(target=_warm, name="civiceye-clip-prefetch", daemon=True).start()
+
+
+def compute_similarity_scores(
+    reference_bytes: bytes, candidates: List[AddressCandidate]
+) -> List[AddressCandidate]:
+    """Compute cosine similarity between the reference photo and each map image."""
+    # Skip loading CLIP when the ranking is trivial: a single candidate, no imagery at all,
+    # or every candidate showing the same image (equal scores keep the current order).
+    map_images = [candidate.map_image for candidate in candidates if candidate.map_image]
+    if (
+        len(candidates) <= 1
+        or not map_images
+        or (len(map_images) == len(candidates) and len(set(map_images)) == 1)
+    ):
+        return candidates
+
+    target_half = _embed_uploaded_bytes(reference_bytes)
+    if target_half is None:
+        st.warning("Visual similarity requires the `transformers` package with CLIP support.")
+        return candidates
+    target_emb = torch.from_numpy(target_half.astype(np.float32))
+
+    # Positions in `candidates` of every entry that has a map image to compare against.
+    indices = [index for index, candidate in enumerate(candidates) if candidate.map_image]
+
+    # Candidates without imagery keep a -inf score so they sink to the end of the ranking.
+    scores = torch.full((len(candidates),), float("-inf"))
+    if indices:
+        map_embs = get_map_embeddings([candidates[index].map_image for index in indices])
+        scores[indices] = map_embs @ target_emb
+
+    for candidate, score in zip(candidates, scores.tolist()):
+        candidate.similarity = score if score != float("-inf") else None
+
+    order = torch.argsort(scores, descending=True, stable=True).tolist()
+    return [candidates[index] for index in order]
@@ -0,0 +1,71 @@
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+CACHE_ROOT = Path.home() / ".cache" / "civiceye"
+
+logger = logging.getLogger(__name__)
+
+
+def read_fresh(path: Path, max_age: float) -> Optional[bytes]:
+    """Return the file's bytes if it is younger than `max_age` seconds; drop it otherwise."""
+    try:
+        if time.time() - path.stat().st_mtime > max_age:
+            path.unlink(missing_ok=True)
+            return None
+        return path.read_bytes()
+    except FileNotFoundError:
+        return None
+    except OSError as exc:
+        logger.warning("Ignoring unreadable cache entry %s: %s", path, exc)
+        return None
+
+
+def write_atomic(path: Path, data: bytes) -> None:
+    """Write bytes via a unique temp file so concurrent readers never see partial files."""
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Streamlit sessions are threads of one process, so the pid alone is not unique.
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f"{path.name}.", suffix=".tmp")
+    except OSError as exc:
+        logger.warning("Failed to write cache entry %s: %s", path, exc)
+        return
+
+    tmp_path = Path(tmp_name)
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            handle.write(data)
+        tmp_path.replace(path)
+    except OSError as exc:
+        logger.warning("Failed to write cache entry %s: %s", path, exc)
+        tmp_path.unlink(missing_ok=True)
+
+
+def prune(directory: Path, max_age: float, max_bytes: int) -> None:
+    """Delete expired files, then the oldest ones until the directory fits in `max_bytes`."""
+    try:
+        paths = [path for path in directory.iterdir() if path.is_file()]
+    except OSError:
+        return
+
+    now = time.time()
+    kept = []
+    for path in paths:
+        try:
+            stat = path.stat()
+            if now - stat.st_mtime > max_age:
+                path.unlink()
+            else:
+                kept.append((stat.st_mtime, stat.st_size, path))
+        except OSError:
+            continue
+
+    total = sum(size for _, size, _ in kept)
+    for _, size, path in sorted(kept):
+        if total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
@@ -1,9 +1,18 @@
+import itertools
+import json
 import logging
 import os
-from typing import Dict, Optional
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
 import requests
 import streamlit as st
+from PIL import Image
+
+from .disk_cache import CACHE_ROOT, prune, read_fresh, write_atomic
+from .session import RateLimiter, create_session
 
 MAP_ZOOM = 17
 MAP_SIZE = "400x400"
@@ -11,12 +20,24 @@ GOOGLE_STATIC_BASE = "https://maps.googleapis.com/maps/api/staticmap"
 GOOGLE_STREET_VIEW_BASE = "https://maps.googleapis.com/maps/api/streetview"
 GOOGLE_METADATA_BASE = "https://maps.googleapis.com/maps/api/streetview/metadata"
 
+MAP_CACHE_DIR = CACHE_ROOT / "maps"
+MAP_CACHE_MAX_AGE = 7 * 24 * 60 * 60  # seconds
+MAP_CACHE_MAX_BYTES = 256 * 1024 * 1024
+MAP_CACHE_PRUNE_EVERY = 100  # stores
+MAX_STORED_IMAGE_SIZE = 480
+STORED_JPEG_QUALITY = 85
+MAP_REQUESTS_PER_SECOND = 10
+
 DEFAULT_HEADERS = {
     "User-Agent": "CivicEye/1.0 (+https://github.com/USERNAME/REPOSITORY)",
 }
 
 logger = logging.getLogger(__name__)
 
+_SESSION = create_session(DEFAULT_HEADERS)
+_RATE_LIMITER = RateLimiter(calls=MAP_REQUESTS_PER_SECOND, period=1)
+_STORE_COUNTER = itertools.count()
+
 
 def get_google_maps_api_key() -> Optional[str]:
     """Load the Google Maps API key from environment variables."""
@@ -31,7 +52,7 @@ def _fetch_street_view_metadata(lat: float, lon: float, api_key: str) -> Dict[st
         "key": api_key,
     }
     try:
-        response = requests.get(GOOGLE_METADATA_BASE, params=params, timeout=15, headers=DEFAULT_HEADERS)
+        response = _SESSION.get(GOOGLE_METADATA_BASE, params=params, timeout=15)
         response.raise_for_status()
         return response.json()
     except requests.RequestException as exc:
@@ -69,7 +90,7 @@ def _fetch_google_street_view(lat: float, lon: float, api_key: str) -> Dict[str,
 
     street_view_url = _build_street_view_url(lat, lon, api_key, heading)
     try:
-        response = requests.get(street_view_url, timeout=30, headers=DEFAULT_HEADERS)
+        response = _SESSION.get(street_view_url, timeout=30)
         response.raise_for_status()
         content_type = response.headers.get("Content-Type", "")
         if not content_type.startswith("image"):
@@ -104,7 +125,7 @@ def _fetch_google_static_map(lat: float, lon: float, api_key: str) -> Dict[str,
     """Download a Google static map image."""
     map_url = _build_google_static_url(lat, lon, api_key)
     try:
-        response = requests.get(map_url, timeout=30, headers=DEFAULT_HEADERS)
+        response = _SESSION.get(map_url, timeout=30)
         response.raise_for_status()
         content_type = response.headers.get("Content-Type", "")
         if not content_type.startswith("image"):
@@ -116,7 +137,75 @@ def _fetch_google_static_map(lat: float, lon: float, api_key: str) -> Dict[str,
         return {"image": None, "url": map_url, "error": str(exc)}
 
 
-@st.cache_data(show_spinner=False)
+def _compact_image(data: bytes) -> bytes:
+    """Re-encode imagery as a bounded JPEG so caches and session state stay small."""
+    try:
+        with Image.open(BytesIO(data)) as image:
+            if image.format == "JPEG" and max(image.size) <= MAX_STORED_IMAGE_SIZE:
+                return data
+            image.thumbnail((MAX_STORED_IMAGE_SIZE, MAX_STORED_IMAGE_SIZE), Image.Resampling.LANCZOS)
+            buffer = BytesIO()
+            image.convert("RGB").save(buffer, format="JPEG", quality=STORED_JPEG_QUALITY, optimize=True)
+    except OSError as exc:
+        logger.warning("Keeping original map image; re-encoding failed: %s", exc)
+        return data
+    return buffer.getvalue()
+
+
+def _map_cache_paths(lat: float, lon: float) -> Tuple[Path, Path]:
+    """Return the on-disk image and metadata files for a location."""
+    stem = f"{lat:.6f}_{lon:.6f}"
+    return MAP_CACHE_DIR / f"{stem}.jpg", MAP_CACHE_DIR / f"{stem}.json"
+
+
+def _strip_api_key(url: Optional[str]) -> Optional[str]:
+    """Drop the `key` query parameter so credentials never reach the disk cache."""
+    if not url:
+        return url
+    parts = urlsplit(url)
+    query = [(name, value) for name, value in parse_qsl(parts.query) if name != "key"]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def _load_cached_map(lat: float, lon: float) -> Optional[Dict[str, Optional[object]]]:
+    """Return a previously stored map result if it exists and is fresh enough."""
+    image_path, meta_path = _map_cache_paths(lat, lon)
+    image = read_fresh(image_path, MAP_CACHE_MAX_AGE)
+    metadata_bytes = read_fresh(meta_path, MAP_CACHE_MAX_AGE)
+    if image is None or metadata_bytes is None:
+        return None
+    try:
+        metadata = json.loads(metadata_bytes)
+    except ValueError as exc:
+        logger.warning("Ignoring corrupt map cache entry %s: %s", meta_path, exc)
+        return None
+    return {
+        "image": image,
+        "provider": metadata.get("provider"),
+        "url": metadata.get("url"),
+        "error": None,
+    }
+
+
+def _store_cached_map(lat: float, lon: float, result: Dict[str, Optional[object]]) -> None:
+    """Persist the image bytes plus keyless metadata, pruning the directory now and then."""
+    image_path, meta_path = _map_cache_paths(lat, lon)
+    metadata = {"provider": result["provider"], "url": _strip_api_key(result["url"])}
+    # The image goes first so a metadata file always has its image next to it.
+    write_atomic(image_path, result["image"])
+    write_atomic(meta_path, json.dumps(metadata).encode("utf-8"))
+    if next(_STORE_COUNTER) % MAP_CACHE_PRUNE_EVERY == 0:
+        prune(MAP_CACHE_DIR, MAP_CACHE_MAX_AGE, MAP_CACHE_MAX_BYTES)
+
+
+class _MapUnavailable(Exception):
+    """Raised inside the memoized download so failed results are never cached."""
+
+    def __init__(self, result: Dict[str, Optional[object]]) -> None:
+        super().__init__(result["error"])
+        self.result = result
+
+
 def fetch_map_image_for_location(lat: float, lon: float) -> Dict[str, Optional[object]]:
     """Return imagery for the requested location, preferring Street View."""
     api_key = get_google_maps_api_key()
@@ -128,6 +217,31 @@ def fetch_map_image_for_location(lat: float, lon: float) -> Dict[str, Optional[o
             "error": "Google Maps API key not configured.",
         }
 
+    try:
+        return _download_map_image(lat, lon, api_key)
+    except _MapUnavailable as exc:
+        return exc.result
+
+
+@st.cache_data(ttl="1d", max_entries=1024, show_spinner=False)
+def _download_map_image(lat: float, lon: float, api_key: str) -> Dict[str, Optional[object]]:
+    """Return imagery from the disk cache or Google; raise `_MapUnavailable` on failure."""
+    cached = _load_cached_map(lat, lon)
+    if cached is not None:
+        return cached
+
+    result = _fetch_map_image(lat, lon, api_key)
+    # Raising keeps failures out of both caches so transient errors are retried later.
+    if not result["image"]:
+        raise _MapUnavailable(result)
+    result["image"] = _compact_image(result["image"])
+    _store_cached_map(lat, lon, result)
+    return result
+
+
+def _fetch_map_image(lat: float, lon: float, api_key: str) -> Dict[str, Optional[object]]:
+    """Download imagery from Google, falling back from Street View to a static map."""
+    _RATE_LIMITER.acquire()
     street_view = _fetch_google_street_view(lat, lon, api_key)
     if street_view["image"]:
         return {
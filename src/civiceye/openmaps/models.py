@@ -1,12 +1,12 @@
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
 
 
 @dataclass
 class AddressCandidate:
     """Represents a single candidate address returned by OpenStreetMap."""
 
-    id: str
+    id: int
     street: str
     city: Optional[str]
     lat: float
@@ -16,3 +16,23 @@ class AddressCandidate:
     map_image: Optional[bytes]
     similarity: Optional[float] = None
     map_error: Optional[str] = None
+    map_fetched: bool = True
+    label: str = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.label = f"{self.street}, {self.city}" if self.city else self.street
+
+
+@dataclass
+class CandidateTable:
+    """Ranked search results plus lookups built once per search, not per rerun."""
+
+    candidates: List[AddressCandidate]
+    by_id: Dict[int, AddressCandidate] = field(init=False)
+    position_by_id: Dict[int, int] = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.by_id = {candidate.id: candidate for candidate in self.candidates}
+        self.position_by_id = {
+            candidate.id: position for position, candidate in enumerate(self.candidates)
+        }
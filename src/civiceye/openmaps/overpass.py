@@ -1,8 +1,18 @@
+import hashlib
+import json
 import logging
-from typing import Dict, List, Optional
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
+import ijson
 import requests
 import streamlit as st
+import urllib3
+
+from .disk_cache import CACHE_ROOT, read_fresh, write_atomic
+from .session import RateLimiter, create_session
 
 OVERPASS_ENDPOINTS = [
     "https://overpass-api.de/api/interpreter",
@@ -10,12 +20,27 @@ OVERPASS_ENDPOINTS = [
     "https://maps.mail.ru/osm/tools/overpass/api/interpreter",
 ]
 
+# Publicly advised Overpass usage: at most one query every two seconds per server.
+OVERPASS_MIN_INTERVAL = 2.0
+# How long a mirror may run before the next one is asked as well.
+OVERPASS_HEDGE_DELAY = 3.0  # seconds
+
+ADDRESS_CACHE_DIR = CACHE_ROOT / "addresses"
+ADDRESS_CACHE_MAX_AGE = 24 * 60 * 60  # seconds
+ADDRESS_MEMORY_TTL = 600  # seconds
+
 REQUEST_HEADERS = {
     "User-Agent": "CivicEye/1.0 (+https://github.com/USERNAME/REPOSITORY)",
 }
 
 logger = logging.getLogger(__name__)
 
+_SESSION = create_session(REQUEST_HEADERS)
+_RATE_LIMITERS = {
+    endpoint: RateLimiter(calls=1, period=OVERPASS_MIN_INTERVAL)
+    for endpoint in OVERPASS_ENDPOINTS
+}
+
 
 def build_overpass_query(zip_code: str, house_number: str) -> str:
     """Build an Overpass API query matching housenumber and postcode."""
@@ -30,67 +55,150 @@ def build_overpass_query(zip_code: str, house_number: str) -> str:
     """
 
 
-@st.cache_data(ttl=600, show_spinner=False)
+def _address_cache_path(zip_code: str, house_number: str) -> Path:
+    """Return the on-disk cache file for a ZIP and house number pair."""
+    digest = hashlib.blake2b(f"{zip_code}|{house_number}".encode(), digest_size=16).hexdigest()
+    return ADDRESS_CACHE_DIR / f"{digest}.json"
+
+
+@st.cache_data(ttl=ADDRESS_MEMORY_TTL, max_entries=512, show_spinner=False)
 def fetch_addresses(zip_code: str, house_number: str) -> List[Dict[str, object]]:
     """Query Overpass API for all addresses matching the ZIP and house number."""
-    query = build_overpass_query(zip_code, house_number)
+    cache_path = _address_cache_path(zip_code, house_number)
+    cached = read_fresh(cache_path, ADDRESS_CACHE_MAX_AGE)
+    if cached is not None:
+        try:
+            return json.loads(cached)
+        except ValueError as exc:
+            logger.warning("Ignoring corrupt address cache entry %s: %s", cache_path, exc)
+
+    matches = _query_overpass(build_overpass_query(zip_code, house_number))
+    # No-match answers are only memoized in memory for ADDRESS_MEMORY_TTL; keeping them
+    # on disk for a day would hide addresses mapped in OSM in the meantime.
+    if matches:
+        write_atomic(cache_path, json.dumps(matches).encode("utf-8"))
+    return matches
 
+
+def _query_overpass(query: str) -> List[Dict[str, object]]:
+    """Return the first successful answer from the Overpass mirrors."""
+    # Ask one mirror at a time and only hedge with the next if it is slow or fails.
+    cancelled = threading.Event()
+    remaining = list(OVERPASS_ENDPOINTS)
+    pending: Set[Future] = set()
     last_error: Optional[requests.RequestException] = None
-    for endpoint in OVERPASS_ENDPOINTS:
-        logger.debug("Querying Overpass endpoint %s", endpoint)
-        try:
-            response = requests.get(
-                endpoint,
-                params={"data": query},
-                timeout=45,
-                headers=REQUEST_HEADERS,
+    executor = ThreadPoolExecutor(max_workers=len(OVERPASS_ENDPOINTS))
+    try:
+        while remaining or pending:
+            if remaining:
+                pending.add(executor.submit(_query_endpoint, remaining.pop(0), query, cancelled))
+            done, pending = wait(
+                pending,
+                timeout=OVERPASS_HEDGE_DELAY if remaining else None,
+                return_when=FIRST_COMPLETED,
             )
-        except requests.RequestException as exc:
-            last_error = exc
-            logger.warning("Overpass endpoint %s failed: %s", endpoint, exc)
-            continue
+            for future in done:
+                try:
+                    return future.result()
+                except requests.RequestException as exc:
+                    last_error = exc
+    finally:
+        # Losing mirrors notice the flag and close their responses early.
+        cancelled.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    raise requests.RequestException(
+        "All Overpass API endpoints failed. "
+        "Please retry in a few minutes or check your network connection."
+    ) from last_error
 
+
+def _query_endpoint(
+    endpoint: str, query: str, cancelled: threading.Event
+) -> List[Dict[str, object]]:
+    """Run the query against a single Overpass endpoint; raise on any failure."""
+    _RATE_LIMITERS[endpoint].acquire()
+    if cancelled.is_set():
+        raise requests.RequestException("Overpass query cancelled; another mirror answered.")
+    logger.debug("Querying Overpass endpoint %s", endpoint)
+    try:
+        response = _SESSION.get(endpoint, params={"data": query}, timeout=45, stream=True)
+    except requests.RequestException as exc:
+        logger.warning("Overpass endpoint %s failed: %s", endpoint, exc)
+        raise
+
+    with response:
         if response.status_code == 429:
-            last_error = requests.RequestException(
+            raise requests.RequestException(
                 "Overpass API rate limit hit. Please try again later."
             )
-            continue
 
         if response.status_code >= 500:
-            last_error = requests.RequestException(
+            logger.warning("Overpass endpoint %s returned %s", endpoint, response.status_code)
+            raise requests.RequestException(
                 f"Overpass API server error ({response.status_code})."
             )
-            logger.warning("Overpass endpoint %s returned %s", endpoint, response.status_code)
-            continue
 
         if response.status_code >= 400:
-            last_error = requests.RequestException(
+            logger.warning("Overpass endpoint %s returned %s", endpoint, response.status_code)
+            raise requests.RequestException(
                 f"Overpass API returned HTTP {response.status_code}."
             )
-            logger.warning("Overpass endpoint %s returned %s", endpoint, response.status_code)
-            continue
 
+        # Parse elements as they arrive instead of materializing the whole payload.
+        response.raw.decode_content = True
+        remarks: List[str] = []
         try:
-            payload = response.json()
-        except ValueError as exc:
-            last_error = requests.RequestException(
-                "Overpass API returned invalid JSON payload."
-            )
+            events = ijson.parse(response.raw)
+            matches = _extract_matches(_iter_elements(events, remarks, cancelled))
+        except ijson.JSONError as exc:
             logger.warning("Overpass endpoint %s returned invalid JSON: %s", endpoint, exc)
-            continue
-
-        elements = payload.get("elements", [])
-        return _extract_matches(elements)
-
-    raise requests.RequestException(
-        "All Overpass API endpoints failed. "
-        "Please retry in a few minutes or check your network connection."
-    ) from last_error
+            raise requests.RequestException(
+                "Overpass API returned invalid JSON payload."
+            ) from exc
+        except urllib3.exceptions.HTTPError as exc:
+            logger.warning("Overpass endpoint %s dropped the response: %s", endpoint, exc)
+            raise requests.RequestException(
+                "Overpass API response was interrupted."
+            ) from exc
+
+    # Timeouts and memory exhaustion arrive as HTTP 200 with a remark and partial elements.
+    if remarks:
+        logger.warning("Overpass endpoint %s reported: %s", endpoint, remarks[0])
+        raise requests.RequestException(
+            f"Overpass API returned an incomplete result: {remarks[0]}"
+        )
+    return matches
 
 
-def _extract_matches(elements: List[Dict[str, object]]) -> List[Dict[str, object]]:
+def _iter_elements(
+    events: Iterable[Tuple[str, str, object]],
+    remarks: List[str],
+    cancelled: threading.Event,
+) -> Iterator[Dict[str, object]]:
+    """Yield each `elements` item from ijson parse events, collecting any top-level remark."""
+    builder: Optional[ijson.ObjectBuilder] = None
+    for prefix, event, value in events:
+        if cancelled.is_set():
+            # Leaving the `with response` block closes the connection mid-stream.
+            raise requests.RequestException("Overpass query cancelled; another mirror answered.")
+        if builder is not None:
+            builder.event(event, value)
+            if prefix == "elements.item" and event == "end_map":
+                yield builder.value
+                builder = None
+        elif prefix == "elements.item" and event == "start_map":
+            builder = ijson.ObjectBuilder()
+            builder.event(event, value)
+        elif prefix == "remark" and event == "string":
+            remarks.append(str(value))
+
+
+def _extract_matches(elements: Iterable[Dict[str, object]]) -> List[Dict[str, object]]:
     """Normalize Overpass response elements into address dictionaries."""
     matches: List[Dict[str, object]] = []
+    # Overpass may return the same address as a node, way and relation at one point.
+    seen: Set[Tuple[object, ...]] = set()
     for element in elements:
         center = element.get("center", {})
         tags = element.get("tags", {})
@@ -100,10 +208,17 @@ def _extract_matches(elements: List[Dict[str, object]]) -> List[Dict[str, object
         if lat is None or lon is None:
             continue
 
+        street = tags.get("addr:street", "Unknown street")
+        city = tags.get("addr:city")
+        key = (street, city, round(float(lat), 6), round(float(lon), 6))
+        if key in seen:
+            continue
+        seen.add(key)
+
         matches.append(
             {
-                "street": tags.get("addr:street", "Unknown street"),
-                "city": tags.get("addr:city"),
+                "street": street,
+                "city": city,
                 "lat": float(lat),
                 "lon": float(lon),
             }
@@ -0,0 +1,51 @@
+import threading
+import time
+from typing import Dict
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class RateLimiter:
+    """Thread-safe token bucket allowing ``calls`` requests per ``period`` seconds."""
+
+    def __init__(self, calls: int, period: float) -> None:
+        self._capacity = float(calls)
+        self._rate = calls / period
+        self._tokens = float(calls)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Block until a request slot is available."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self._capacity, self._tokens + (now - self._updated) * self._rate
+            )
+            self._updated = now
+            # Going negative reserves a future slot, so waiters queue up fairly.
+            self._tokens -= 1
+            delay = -self._tokens / self._rate if self._tokens < 0 else 0.0
+        if delay > 0:
+            time.sleep(delay)
+
+
+def create_session(headers: Dict[str, str]) -> requests.Session:
+    """Create a pooled HTTP session that retries rate limits and gateway errors."""
+    retry = Retry(
+        total=3,
+        backoff_factor=1,
+        status_forcelist=(429, 502, 503, 504),
+        allowed_methods=frozenset({"GET"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=retry)
+
+    session = requests.Session()
+    session.headers.update(headers)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
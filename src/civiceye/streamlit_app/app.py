@@ -1,29 +1,98 @@
+import math
 import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from io import BytesIO
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
 import requests
 import streamlit as st
+from PIL import Image
 
-from ..clip.similarity import compute_similarity_scores
 from ..openmaps.maps import fetch_map_image_for_location, get_google_maps_api_key
-from ..openmaps.models import AddressCandidate
+from ..openmaps.models import AddressCandidate, CandidateTable
 from ..openmaps.overpass import fetch_addresses
 
 MAX_ADDRESS_RESULTS = 100
+MAP_FETCH_WORKERS = 16
+COORD_PRECISION = 6
 DEFAULT_CARD_WIDTH = 260
+PREVIEW_WIDTH = 420
+CARDS_PER_PAGE = 12
+LIVE_PREVIEW_COLUMNS = 6
+LIVE_PREVIEW_WIDTH = 140
+CLIP_MODULE = "civiceye.clip.similarity"
 
 SESSION_RESULTS_KEY = "civiceye_results"
 SESSION_SELECTED_ID_KEY = "civiceye_selected_id"
 SESSION_HAS_SIMILARITY_KEY = "civiceye_has_similarity"
 SESSION_CARD_WIDTH_KEY = "civiceye_card_width"
-FOOTER_STYLE_KEY = "civiceye_footer_style"
+SESSION_OPTION_LABELS_KEY = "civiceye_option_labels"
+SESSION_OPTION_IDS_KEY = "civiceye_option_ids"
+SEARCH_RESULT_KEYS = (
+    SESSION_RESULTS_KEY,
+    SESSION_SELECTED_ID_KEY,
+    SESSION_HAS_SIMILARITY_KEY,
+    SESSION_OPTION_LABELS_KEY,
+    SESSION_OPTION_IDS_KEY,
+)
 _ENV_PATH = Path(__file__).resolve().parents[3] / ".env"
 
-
-def load_env_file() -> None:
+# Streamlit drops elements that a rerun does not emit again, so this single style
+# block is written on every run rather than guarded by session state.
+PAGE_STYLE = """
+<style>
+    .hero-box {
+        background: linear-gradient(120deg, #6A0D83, #EE5D6C);
+        color: #F8F2EB;
+        padding: 1.8rem;
+        border-radius: 16px;
+        margin-bottom: 1.5rem;
+    }
+    .hero-box h1 {
+        margin: 0 0 0.6rem 0;
+    }
+    .stApp {
+        min-height: 100vh;
+        display: flex;
+        flex-direction: column;
+    }
+    div[data-testid="stAppViewContainer"] > .main {
+        flex: 1 0 auto;
+    }
+    footer {
+        visibility: hidden;
+    }
+    .custom-footer {
+        flex-shrink: 0;
+        margin-top: 3rem;
+        padding: 1.5rem 0 2rem;
+        text-align: center;
+        font-size: 0.9rem;
+        color: var(--text-color, #1F1F24);
+    }
+    .custom-footer hr {
+        width: min(320px, 80%);
+        margin: 0 auto 1rem;
+        height: 1px;
+        border: none;
+        background: linear-gradient(90deg, transparent, rgba(106, 13, 131, 0.35), transparent);
+    }
+    .custom-footer a {
+        color: inherit;
+        text-decoration: none;
+        border-bottom: 1px solid rgba(238, 93, 108, 0.45);
+    }
+</style>
+"""
+
+
+@st.cache_resource(show_spinner=False)
+def load_env_file() -> bool:
+    """Apply `.env` once per process; later reruns hit the cache instead of the disk."""
     if not _ENV_PATH.exists():
-        return
+        return False
 
     for line in _ENV_PATH.read_text(encoding="utf-8").splitlines():
         stripped = line.strip()
@@ -36,27 +105,12 @@ def load_env_file() -> None:
 
         if key and key not in os.environ:
             os.environ[key] = value
+    return True
 
 
 def configure_page() -> None:
     st.set_page_config(page_title="CivicEye", page_icon="👁️", layout="wide")
-    st.markdown(
-        """
-        <style>
-        .hero-box {
-            background: linear-gradient(120deg, #6A0D83, #EE5D6C);
-            color: #F8F2EB;
-            padding: 1.8rem;
-            border-radius: 16px;
-            margin-bottom: 1.5rem;
-        }
-        .hero-box h1 {
-            margin: 0 0 0.6rem 0;
-        }
-        </style>
-        """,
-        unsafe_allow_html=True,
-    )
+    st.markdown(PAGE_STYLE, unsafe_allow_html=True)
 
 
 def render_intro(api_key_present: bool) -> None:
@@ -80,14 +134,78 @@ def render_intro(api_key_present: bool) -> None:
     )
 
 
+def fetch_map_data(
+    rows: List[Dict[str, object]], progress_bar, live_preview=None
+) -> List[Dict[str, Optional[object]]]:
+    """Fetch map imagery for every row concurrently, returning results in row order."""
+    # Round to ~10 cm so near-identical coordinates share one download and cache entry.
+    row_keys = [
+        (round(float(row["lat"]), COORD_PRECISION), round(float(row["lon"]), COORD_PRECISION))
+        for row in rows
+    ]
+    unique_keys = list(dict.fromkeys(row_keys))
+
+    # Show the first thumbnails as they land so the wait isn't a bare progress bar.
+    preview_columns = live_preview.container().columns(LIVE_PREVIEW_COLUMNS) if live_preview else []
+    previews_shown = 0
+
+    fetched: Dict[Tuple[float, float], Dict[str, Optional[object]]] = {}
+    with ThreadPoolExecutor(max_workers=MAP_FETCH_WORKERS) as executor:
+        futures = {
+            executor.submit(fetch_map_image_for_location, lat, lon): (lat, lon)
+            for lat, lon in unique_keys
+        }
+        # Report progress as downloads finish so one slow request doesn't stall the bar.
+        for done, future in enumerate(as_completed(futures), start=1):
+            lat, lon = futures[future]
+            map_data = fetched[(lat, lon)] = future.result()
+            if preview_columns and map_data.get("image") and previews_shown < CARDS_PER_PAGE:
+                with preview_columns[previews_shown % LIVE_PREVIEW_COLUMNS]:
+                    st.image(
+                        render_thumbnail(map_data["image"], LIVE_PREVIEW_WIDTH),
+                        caption=f"{lat:.5f}, {lon:.5f}",
+                    )
+                previews_shown += 1
+            if progress_bar:
+                fraction = done / max(len(unique_keys), 1)
+                progress_bar.progress(
+                    25 + int(fraction * 45), text="Processing map imagery…"
+                )
+    return [fetched[key] for key in row_keys]
+
+
+def ensure_map_image(candidate: AddressCandidate) -> None:
+    """Fetch imagery for a candidate whose bulk map download was skipped."""
+    if candidate.map_fetched:
+        return
+
+    map_data = fetch_map_image_for_location(
+        round(candidate.lat, COORD_PRECISION), round(candidate.lon, COORD_PRECISION)
+    )
+    candidate.map_url = str(map_data.get("url") or "")
+    candidate.map_provider = str(map_data.get("provider") or "Static imagery")
+    candidate.map_image = map_data.get("image")
+    candidate.map_error = map_data.get("error")
+    candidate.map_fetched = True
+
+
+def _prefetch_map_embeddings(map_images: List[bytes]) -> None:
+    """Warm CLIP's embedding cache if an earlier photo search already imported it."""
+    # Never pull in torch just to prefetch; address-only sessions stay CLIP-free.
+    if CLIP_MODULE not in sys.modules:
+        return
+    from ..clip.similarity import prefetch_map_embeddings
+
+    prefetch_map_embeddings(map_images)
+
+
 def handle_search(
-    zip_code: str, house_number: str, uploaded_image, progress_bar
+    zip_code: str, house_number: str, uploaded_image, progress_bar, live_preview=None
 ) -> None:
-    st.session_state.pop(SESSION_RESULTS_KEY, None)
-    st.session_state.pop(SESSION_SELECTED_ID_KEY, None)
-    st.session_state.pop(SESSION_HAS_SIMILARITY_KEY, None)
-    st.session_state[SESSION_CARD_WIDTH_KEY] = DEFAULT_CARD_WIDTH
-    st.session_state["results_capped"] = False
+    state = st.session_state
+    for key in SEARCH_RESULT_KEYS:
+        state.pop(key, None)
+    state.update({SESSION_CARD_WIDTH_KEY: DEFAULT_CARD_WIDTH, "results_capped": False})
 
     progress_bar.progress(5, text="Contacting OpenStreetMap…")
 
@@ -107,13 +225,20 @@ def handle_search(
         st.warning("No addresses found for that combination.")
         return
 
-    progress_bar.progress(25, text="Loading map previews…")
-    candidates: List[AddressCandidate] = []
     limited_rows = address_rows[:MAX_ADDRESS_RESULTS]
-    for index, row in enumerate(limited_rows):
-        map_data = fetch_map_image_for_location(row["lat"], row["lon"])
+    results_capped = len(address_rows) > MAX_ADDRESS_RESULTS
+    # Capped results hide the grid, so without a photo to rank there is no need for
+    # bulk imagery; the selected address is fetched on demand in display_results.
+    lazy_maps = results_capped and not uploaded_image
+    if lazy_maps:
+        map_results = [{} for _ in limited_rows]
+    else:
+        progress_bar.progress(25, text="Loading map previews…")
+        map_results = fetch_map_data(limited_rows, progress_bar, live_preview)
+    candidates: List[AddressCandidate] = []
+    for index, (row, map_data) in enumerate(zip(limited_rows, map_results)):
         candidate = AddressCandidate(
-            id=f"{row['lat']:.6f}|{row['lon']:.6f}|{index}",
+            id=index,
             street=str(row["street"]),
             city=str(row["city"]) if row.get("city") else None,
             lat=float(row["lat"]),
@@ -122,39 +247,73 @@ def handle_search(
             map_provider=str(map_data.get("provider") or "Static imagery"),
             map_image=map_data.get("image"),
             map_error=map_data.get("error"),
+            map_fetched=not lazy_maps,
         )
         candidates.append(candidate)
-        if progress_bar:
-            fraction = (index + 1) / max(len(limited_rows), 1)
-            progress_bar.progress(
-                25 + int(fraction * 45), text="Processing map imagery…"
-            )
 
-    if len(address_rows) > MAX_ADDRESS_RESULTS:
-        st.session_state["results_capped"] = True
+    if results_capped:
+        state["results_capped"] = True
         st.info(
             f"Showing the first {MAX_ADDRESS_RESULTS} matches. "
             "Use the dropdown to inspect individual locations."
         )
 
     if uploaded_image:
+        # torch/CLIP are imported on first use so plain address lookups start fast.
+        from ..clip.similarity import compute_similarity_scores
+
         progress_bar.progress(80, text="Computing similarity scores…")
-        candidates = compute_similarity_scores(uploaded_image, candidates)
+        candidates = compute_similarity_scores(uploaded_image.getvalue(), candidates)
         similarity_available = any(
             candidate.similarity is not None for candidate in candidates
         )
-        st.session_state[SESSION_HAS_SIMILARITY_KEY] = similarity_available
+        state[SESSION_HAS_SIMILARITY_KEY] = similarity_available
         if similarity_available and candidates and candidates[0].similarity is not None:
-            st.session_state[SESSION_SELECTED_ID_KEY] = candidates[0].id
+            state[SESSION_SELECTED_ID_KEY] = candidates[0].id
     else:
-        st.session_state[SESSION_HAS_SIMILARITY_KEY] = False
+        state[SESSION_HAS_SIMILARITY_KEY] = False
+        # Warm the embedding cache so re-searching with a photo only needs a matmul.
+        _prefetch_map_embeddings(
+            [candidate.map_image for candidate in candidates if candidate.map_image]
+        )
 
-    st.session_state[SESSION_RESULTS_KEY] = candidates
+    option_labels = build_option_labels(candidates)
+    state.update(
+        {
+            SESSION_OPTION_LABELS_KEY: option_labels,
+            SESSION_OPTION_IDS_KEY: [candidate.id for candidate in candidates],
+            SESSION_RESULTS_KEY: CandidateTable(candidates),
+        }
+    )
     progress_bar.progress(100, text="Search complete")
 
 
+def build_option_labels(candidates: List[AddressCandidate]) -> List[str]:
+    # Ids are row indices, so labels live in a list indexed by id rather than a dict.
+    option_labels = [""] * len(candidates)
+    for idx, candidate in enumerate(candidates, start=1):
+        label = f"#{idx} {candidate.label}"
+        if candidate.similarity is not None:
+            label += f" • sim {candidate.similarity:.2f}"
+        option_labels[candidate.id] = label
+    return option_labels
+
+
+@st.cache_data(show_spinner=False, max_entries=1024)
+def render_thumbnail(image: bytes, width: int) -> bytes:
+    """Decode and downscale a preview once per width so reruns skip the PIL work."""
+    with Image.open(BytesIO(image)) as pil_image:
+        if pil_image.width <= width:
+            return image
+        height = round(pil_image.height * width / pil_image.width)
+        resized = pil_image.convert("RGB").resize((width, height), Image.Resampling.LANCZOS)
+    buffer = BytesIO()
+    resized.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
 def render_card_grid(
-    candidates: List[AddressCandidate], selected_id: str, card_width: int
+    candidates: List[AddressCandidate], selected_id: int, card_width: int, offset: int = 0
 ) -> None:
     if not candidates:
         return
@@ -162,16 +321,24 @@ def render_card_grid(
     gutter = 16
     approx_width = 940  # rough main column width
     columns_per_row = max(1, int(approx_width / max(card_width + gutter, 1)))
+    columns_per_row = min(columns_per_row, len(candidates))
 
+    # One st.columns call per row keeps rows aligned and cards in ranking order.
     for start in range(0, len(candidates), columns_per_row):
+        columns = st.columns(columns_per_row, gap="small")
         row_candidates = candidates[start : start + columns_per_row]
-        columns = st.columns(len(row_candidates), gap="small")
-        for column, item in zip(columns, enumerate(row_candidates, start=start)):
-            idx, candidate = item
-            rank = idx + 1
+        for col_idx, (column, candidate) in enumerate(zip(columns, row_candidates)):
+            rank = offset + start + col_idx + 1
+            # The rank matches the dropdown label, which is now the selection control.
+            if candidate.similarity is not None:
+                rank_caption = f"#{rank} • Similarity {candidate.similarity:.2f}"
+            else:
+                rank_caption = f"#{rank}"
+            coords_caption = f"{candidate.lat:.5f}, {candidate.lon:.5f}"
+
             with column:
                 if candidate.map_image:
-                    st.image(candidate.map_image, width=card_width)
+                    st.image(render_thumbnail(candidate.map_image, card_width), width=card_width)
                 elif candidate.map_url:
                     st.image(candidate.map_url, width=card_width)
                 elif candidate.map_error:
@@ -179,37 +346,56 @@ def render_card_grid(
                 else:
                     st.info("Map preview unavailable.")
 
-                street_line = candidate.street
-                if candidate.city:
-                    street_line += f", {candidate.city}"
-                st.write(street_line)
-                st.caption(f"{candidate.lat:.5f}, {candidate.lon:.5f}")
-
-                if candidate.similarity is not None:
-                    st.caption(f"#{rank} • Similarity {candidate.similarity:.2f}")
-
-                st.button(
-                    "Selected" if candidate.id == selected_id else "Select",
-                    key=f"select_btn_{candidate.id}",
-                    disabled=candidate.id == selected_id,
-                    use_container_width=True,
-                    on_click=(
-                        None
-                        if candidate.id == selected_id
-                        else lambda cid=candidate.id: st.session_state.update(
-                            {SESSION_SELECTED_ID_KEY: cid}
-                        )
-                    ),
-                )
+                st.write(candidate.label)
+                st.caption(coords_caption)
+                st.caption(rank_caption)
+
+                if candidate.id == selected_id:
+                    st.markdown("**✓ Selected**")
+
+
+@st.fragment
+def render_preview_grid(
+    candidates: List[AddressCandidate], selected_id: int, results_capped: bool
+) -> None:
+    card_width = st.slider(
+        "Thumbnail width",
+        min_value=180,
+        max_value=480,
+        step=20,
+        value=st.session_state.get(SESSION_CARD_WIDTH_KEY, DEFAULT_CARD_WIDTH),
+        help="Control how wide each preview appears.",
+    )
+    st.session_state[SESSION_CARD_WIDTH_KEY] = card_width
+
+    if results_capped:
+        st.info(
+            "Preview grid disabled because too many matches were returned. "
+            "Use the dropdown to inspect individual entries."
+        )
+    else:
+        # Only the active page is rendered so image widgets don't scale with result count.
+        page_count = math.ceil(len(candidates) / CARDS_PER_PAGE)
+        page = 1
+        if page_count > 1:
+            page = int(
+                st.number_input("Page", min_value=1, max_value=page_count, value=1, step=1)
+            )
+        offset = (page - 1) * CARDS_PER_PAGE
+        render_card_grid(
+            candidates[offset : offset + CARDS_PER_PAGE], selected_id, card_width, offset
+        )
 
 
 def display_results() -> None:
-    candidates: List[AddressCandidate] = st.session_state.get(SESSION_RESULTS_KEY, [])
-    if not candidates:
+    state = st.session_state
+    table: Optional[CandidateTable] = state.get(SESSION_RESULTS_KEY)
+    if not table or not table.candidates:
         return
+    candidates = table.candidates
 
-    has_similarity = st.session_state.get(SESSION_HAS_SIMILARITY_KEY, False)
-    results_capped = st.session_state.get("results_capped", False)
+    has_similarity = state.get(SESSION_HAS_SIMILARITY_KEY, False)
+    results_capped = state.get("results_capped", False)
 
     st.subheader(f"Found {len(candidates)} possible addresses")
     if has_similarity:
@@ -217,74 +403,46 @@ def display_results() -> None:
             "Results are ordered by cosine similarity with the uploaded reference image."
         )
 
-    option_labels = {}
-    for idx, candidate in enumerate(candidates, start=1):
-        label = f"#{idx} {candidate.street}"
-        if candidate.city:
-            label += f", {candidate.city}"
-        if candidate.similarity is not None:
-            label += f" • sim {candidate.similarity:.2f}"
-        option_labels[candidate.id] = label
-
-    option_ids = list(option_labels.keys())
+    option_labels: List[str] = state.get(SESSION_OPTION_LABELS_KEY, [])
+    option_ids: List[int] = state.get(SESSION_OPTION_IDS_KEY, [])
     if not option_ids:
         return
 
-    default_id = st.session_state.get(SESSION_SELECTED_ID_KEY, option_ids[0])
-    index = option_ids.index(default_id) if default_id in option_ids else 0
+    default_id = state.get(SESSION_SELECTED_ID_KEY, option_ids[0])
+    index = table.position_by_id.get(default_id, 0)
 
     with st.expander("Explore matches", expanded=True):
         selected_id = st.selectbox(
             "Select an address to inspect",
             options=option_ids,
             index=index,
-            format_func=lambda cid: option_labels.get(cid, cid),
+            format_func=lambda cid: option_labels[cid],
             key=SESSION_SELECTED_ID_KEY,
         )
 
-        card_width = st.slider(
-            "Thumbnail width",
-            min_value=180,
-            max_value=480,
-            step=20,
-            value=st.session_state.get(SESSION_CARD_WIDTH_KEY, DEFAULT_CARD_WIDTH),
-            help="Control how wide each preview appears.",
-        )
-        st.session_state[SESSION_CARD_WIDTH_KEY] = card_width
-
-        if results_capped:
-            st.info(
-                "Preview grid disabled because too many matches were returned. "
-                "Use the dropdown to inspect individual entries."
-            )
-        else:
-            render_card_grid(candidates, selected_id, card_width)
+        render_preview_grid(candidates, selected_id, results_capped)
 
-    selected_candidate = next(
-        candidate for candidate in candidates if candidate.id == selected_id
-    )
+    selected_candidate = table.by_id[selected_id]
+    # Candidates live in session state, so the fetched imagery sticks across reruns.
+    ensure_map_image(selected_candidate)
 
     st.subheader("Selected address")
-    street_line = selected_candidate.street
-    if selected_candidate.city:
-        street_line += f", {selected_candidate.city}"
-    st.write(street_line)
+    st.write(selected_candidate.label)
     st.write(f"Coordinates: {selected_candidate.lat:.6f}, {selected_candidate.lon:.6f}")
     st.caption(f"Imagery provider: {selected_candidate.map_provider}")
     if selected_candidate.similarity is not None:
         st.caption(f"Similarity score: {selected_candidate.similarity:.2f}")
 
-    if not results_capped:
-        if selected_candidate.map_image:
-            st.image(selected_candidate.map_image, caption="Preview", width=420)
-        elif selected_candidate.map_error:
-            st.info(selected_candidate.map_error)
-        else:
-            st.info("Map preview unavailable for this address.")
-    else:
-        st.info(
-            f"Preview disabled when more than {MAX_ADDRESS_RESULTS} matches are returned."
+    if selected_candidate.map_image:
+        st.image(
+            render_thumbnail(selected_candidate.map_image, PREVIEW_WIDTH),
+            caption="Preview",
+            width=PREVIEW_WIDTH,
         )
+    elif selected_candidate.map_error:
+        st.info(selected_candidate.map_error)
+    else:
+        st.info("Map preview unavailable for this address.")
 
     maps_link = f"https://www.google.com/maps?q={selected_candidate.lat},{selected_candidate.lon}"
     st.link_button("Open in Google Maps", maps_link)
@@ -313,54 +471,17 @@ def render_search_form() -> None:
             return
 
         progress_bar = st.progress(0, text="Starting search…")
+        live_preview = st.empty()
         try:
-            handle_search(zip_code.strip(), house_number.strip(), uploaded_image, progress_bar)
+            handle_search(
+                zip_code.strip(), house_number.strip(), uploaded_image, progress_bar, live_preview
+            )
         finally:
             progress_bar.empty()
+            live_preview.empty()
 
 
 def render_footer() -> None:
-    if not st.session_state.get(FOOTER_STYLE_KEY):
-        st.markdown(
-            """
-            <style>
-                .stApp {
-                    min-height: 100vh;
-                    display: flex;
-                    flex-direction: column;
-                }
-                div[data-testid="stAppViewContainer"] > .main {
-                    flex: 1 0 auto;
-                }
-                footer {
-                    visibility: hidden;
-                }
-                .custom-footer {
-                    flex-shrink: 0;
-                    margin-top: 3rem;
-                    padding: 1.5rem 0 2rem;
-                    text-align: center;
-                    font-size: 0.9rem;
-                    color: var(--text-color, #1F1F24);
-                }
-                .custom-footer hr {
-                    width: min(320px, 80%);
-                    margin: 0 auto 1rem;
-                    height: 1px;
-                    border: none;
-                    background: linear-gradient(90deg, transparent, rgba(106, 13, 131, 0.35), transparent);
-                }
-                .custom-footer a {
-                    color: inherit;
-                    text-decoration: none;
-                    border-bottom: 1px solid rgba(238, 93, 108, 0.45);
-                }
-            </style>
-            """,
-            unsafe_allow_html=True,
-        )
-        st.session_state[FOOTER_STYLE_KEY] = True
-
     st.markdown(
         """
         <div class="custom-footer">